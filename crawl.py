@@ -1,9 +1,12 @@
+import hashlib
+import heapq
+import itertools
+import math
 import os
-import queue
 import re
 import time
 import shutil
-from datetime import datetime
+from datetime import date, datetime
 import urllib.parse
 import urllib.robotparser
 import xml.etree.ElementTree as ET
@@ -23,12 +26,29 @@ BASE_URLS = [
 
 OUTPUT_DIR = "./data"
 LOG_FILE = "crawl_log.csv"
+# Per-URL fetch history used for change rates; kept across "reset" runs, unlike LOG_FILE.
+HISTORY_FILE = "crawl_history.csv"
 
 MAX_PAGES_PER_DOMAIN = 5000
+# Per-domain overrides for MAX_PAGES_PER_DOMAIN, keyed by normalized domain.
+DOMAIN_BUDGETS = {}
 REQUEST_DELAY = 0.5
 USER_AGENT = "CSULB-RAG-Crawler/0.1 (+rohildalal@gmail.com)"
 # How to handle URLs from previous runs: "overwrite", "skip", or "reset" (clears data and log before crawling).
 DUPLICATE_MODE = "reset"
+# ISO date (e.g. "2025-11-01"); when set, only crawl sitemap URLs with a <lastmod> on or after it and don't follow links.
+# Requires DUPLICATE_MODE "overwrite" or "skip"; main() refuses to "reset" the corpus for a recrawl.
+RECRAWL_SINCE = None
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+MAX_SITEMAP_DEPTH = 3
+DEFAULT_SITEMAP_PRIORITY = 0.5
+# Frontier scoring weights; higher score is crawled first.
+FRESHNESS_WEIGHT = 1.0
+PRIORITY_WEIGHT = 1.0
+CHANGE_WEIGHT = 1.0
+DEPTH_WEIGHT = 0.25
+FRESHNESS_HALF_LIFE_DAYS = 30
 
 
 def normalize_domain(netloc):
@@ -94,12 +114,16 @@ def log_csv(row):
 
 
 def load_seen(domain):
+    """Return (urls, count, last_crawled) for successful crawls of domain in LOG_FILE.
+
+    last_crawled maps canonical URL to the most recent crawl date.
+    """
     if not os.path.exists(LOG_FILE):
-        return set(), 0
+        return set(), 0, {}
     try:
         df = pd.read_csv(LOG_FILE)
     except Exception:
-        return set(), 0
+        return set(), 0, {}
     df = df[df["status"] == 200]
 
     def _domain_from_url(url):
@@ -110,7 +134,150 @@ def load_seen(domain):
 
     df = df[df["url"].apply(_domain_from_url) == domain]
     urls = set(df["url"].tolist())
-    return urls, len(urls)
+
+    last_crawled = {}
+    for url, ts in zip(df["url"].astype(str), df["timestamp"].astype(str)):
+        try:
+            crawled = date.fromisoformat(ts[:10])
+        except ValueError:
+            continue
+        key = canonical_url(url)
+        if key not in last_crawled or crawled > last_crawled[key]:
+            last_crawled[key] = crawled
+    return urls, len(urls), last_crawled
+
+
+def log_history(row):
+    os.makedirs(os.path.dirname(HISTORY_FILE) or ".", exist_ok=True)
+    exists = os.path.exists(HISTORY_FILE)
+    cols = ["url", "timestamp", "text_length", "content_hash"]
+    pd.DataFrame([row], columns=cols).to_csv(
+        HISTORY_FILE, mode="a", header=not exists, index=False
+    )
+
+
+def load_change_rates(domain):
+    """Fraction of repeat fetches per canonical URL whose content hash changed."""
+    if not os.path.exists(HISTORY_FILE):
+        return {}
+    try:
+        df = pd.read_csv(HISTORY_FILE)
+    except Exception:
+        return {}
+    rates = {}
+    for url, group in df.groupby(df["url"].astype(str).apply(canonical_url)):
+        host = url.split("/", 1)[0]
+        if host != domain and not host.endswith("." + domain):
+            continue
+        hashes = group.sort_values("timestamp", kind="stable")["content_hash"].tolist()
+        if len(hashes) < 2:
+            continue
+        changes = sum(1 for a, b in zip(hashes, hashes[1:]) if a != b)
+        rates[url] = changes / (len(hashes) - 1)
+    return rates
+
+
+def parse_lastmod(value):
+    """Parse a W3C datetime <lastmod> into a date; None if missing or malformed."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    # Reduced-precision forms: YYYY and YYYY-MM.
+    if re.fullmatch(r"\d{4}(-\d{2})?", value):
+        year, _, month = value.partition("-")
+        try:
+            return date(int(year), int(month or 1), 1)
+        except ValueError:
+            return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+    except ValueError:
+        pass
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def parse_priority(value):
+    try:
+        priority = float((value or "").strip())
+    except ValueError:
+        return DEFAULT_SITEMAP_PRIORITY
+    if not math.isfinite(priority):
+        return DEFAULT_SITEMAP_PRIORITY
+    return min(max(priority, 0.0), 1.0)
+
+
+def fetch_sitemap_entries(sitemap_url, domain, depth=0, visited=None):
+    """Return {url, lastmod, priority} from a sitemap, following nested sitemap indexes."""
+    visited = set() if visited is None else visited
+    if sitemap_url in visited or depth > MAX_SITEMAP_DEPTH:
+        return []
+    visited.add(sitemap_url)
+    try:
+        resp = requests.get(sitemap_url, headers={"User-Agent": USER_AGENT}, timeout=20)
+        tree = ET.fromstring(resp.content)
+    except Exception:
+        return []
+
+    entries = []
+    if tree.tag == f"{SITEMAP_NS}sitemapindex":
+        for sm in tree.iter(f"{SITEMAP_NS}sitemap"):
+            child = (sm.findtext(f"{SITEMAP_NS}loc") or "").strip()
+            if child and url_in_domain(child, domain):
+                entries.extend(fetch_sitemap_entries(child, domain, depth + 1, visited))
+        return entries
+
+    for node in tree.iter(f"{SITEMAP_NS}url"):
+        url = (node.findtext(f"{SITEMAP_NS}loc") or "").strip()
+        if not url or not url_in_domain(url, domain):
+            continue
+        entries.append(
+            {
+                "url": url,
+                "lastmod": parse_lastmod(node.findtext(f"{SITEMAP_NS}lastmod")),
+                "priority": parse_priority(node.findtext(f"{SITEMAP_NS}priority")),
+            }
+        )
+    return entries
+
+
+def score_url(lastmod, priority, depth, change_rate, last_crawled=None, today=None):
+    today = today or date.today()
+    freshness = 0.0
+    # No freshness bonus when the page hasn't been modified since we last stored it. LOG_FILE
+    # timestamps are date-only, so a lastmod on the crawl day counts as possibly modified.
+    if lastmod and not (last_crawled and lastmod < last_crawled):
+        age_days = max((today - lastmod).days, 0)
+        freshness = 0.5 ** (age_days / FRESHNESS_HALF_LIFE_DAYS)
+    return (
+        FRESHNESS_WEIGHT * freshness
+        + PRIORITY_WEIGHT * priority
+        + CHANGE_WEIGHT * change_rate
+        - DEPTH_WEIGHT * depth
+    )
+
+
+class Frontier:
+    """Max-priority URL queue; ties keep insertion order."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def put(self, url, score, depth):
+        heapq.heappush(self._heap, (-score, next(self._counter), url, depth))
+
+    def get(self):
+        _, _, url, depth = heapq.heappop(self._heap)
+        return url, depth
+
+    def qsize(self):
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
 
 
 def fetch_page(url, user_agent, timeout=15):
@@ -128,53 +295,63 @@ def crawl(base_url):
     except Exception:
         rp = None
 
-    seen_ok, already_ok = load_seen(domain)
+    budget = DOMAIN_BUDGETS.get(domain, MAX_PAGES_PER_DOMAIN)
+    recrawl_since = date.fromisoformat(RECRAWL_SINCE) if RECRAWL_SINCE else None
+    seen_ok, already_ok, last_crawled = load_seen(domain)
     seen_ok_canon = {canonical_url(u) for u in seen_ok}
+    change_rates = load_change_rates(domain)
     seen = set()
-    if already_ok >= MAX_PAGES_PER_DOMAIN:
-        print(f"[skip] {domain} already has {already_ok} pages (>= max {MAX_PAGES_PER_DOMAIN})")
+    if recrawl_since is None and already_ok >= budget:
+        print(f"[skip] {domain} already has {already_ok} pages (>= max {budget})")
         return
 
-    start_urls = []
+    entries = []
     if rp:
         try:
             sitemaps = rp.site_maps() or []
         except Exception:
             sitemaps = []
+        visited = set()
         for sm in sitemaps:
-            try:
-                resp = requests.get(sm, timeout=20)
-                tree = ET.fromstring(resp.content)
-                for loc in tree.iter("{http://www.sitemaps.org/schemas/sitemap/0.9}loc"):
-                    url = (loc.text or "").strip()
-                    if url and url_in_domain(url, domain):
-                        start_urls.append(url)
-            except Exception:
-                continue
-    if not start_urls:
-        start_urls.append(base_url)
-
-    q = queue.Queue()
+            entries.extend(fetch_sitemap_entries(sm, domain, visited=visited))
+    if recrawl_since is not None:
+        entries = [
+            e
+            for e in entries
+            if e["lastmod"]
+            and e["lastmod"] >= recrawl_since
+            # >= since crawl dates are date-only; see score_url.
+            and e["lastmod"] >= last_crawled.get(canonical_url(e["url"]), date.min)
+        ]
+        print(f"[recrawl] {domain}: {len(entries)} sitemap URLs modified since {recrawl_since}")
+    elif not entries:
+        entries.append({"url": base_url, "lastmod": None, "priority": DEFAULT_SITEMAP_PRIORITY})
+
+    q = Frontier()
     queued = set()
     queued_canon = set()
-    for u in start_urls:
-        key = canonical_url(u)
+    for e in entries:
+        key = canonical_url(e["url"])
         if key in queued_canon:
             continue
-        q.put(u)
-        queued.add(u)
+        score = score_url(
+            e["lastmod"], e["priority"], 0, change_rates.get(key, 0.0), last_crawled.get(key)
+        )
+        q.put(e["url"], score, 0)
+        queued.add(e["url"])
         queued_canon.add(key)
-    saved = already_ok
+    # A recrawl refreshes already-known pages, so its budget counts this run's saves only.
+    saved = 0 if recrawl_since is not None else already_ok
     request_idx = 0
 
-    while not q.empty() and saved < MAX_PAGES_PER_DOMAIN:
-        url = q.get()
+    while not q.empty() and saved < budget:
+        url, depth = q.get()
         ckey = canonical_url(url)
         if ckey in seen or not url_in_domain(url, domain):
             continue
         seen.add(ckey)
         already_crawled = ckey in seen_ok_canon
-        skip_save = DUPLICATE_MODE == "skip" and already_crawled
+        skip_save = DUPLICATE_MODE == "skip" and already_crawled and recrawl_since is None
         timestamp = datetime.now().date().isoformat()
         request_idx += 1
         print(f"[{request_idx}/{q.qsize()}] {url}")
@@ -237,6 +414,15 @@ def crawl(base_url):
             continue
 
         text = clean_text(html)
+        if text:
+            log_history(
+                {
+                    "url": url,
+                    "timestamp": timestamp,
+                    "text_length": len(text),
+                    "content_hash": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+                }
+            )
         should_save = text and not skip_save
         if should_save:
             path = save_text(text, url, OUTPUT_DIR)
@@ -253,16 +439,24 @@ def crawl(base_url):
                     "note": "",
                 }
             )
-            if not already_crawled:
+            if not already_crawled or recrawl_since is not None:
                 saved += 1
 
+        if recrawl_since is not None:
+            if REQUEST_DELAY:
+                time.sleep(REQUEST_DELAY)
+            continue
+
         soup_links = extract_links(html, url)
         for link in soup_links:
             c_link = canonical_url(link)
             if DUPLICATE_MODE == "skip" and c_link in seen_ok_canon:
                 continue
             if c_link not in seen and c_link not in queued_canon and url_in_domain(link, domain):
-                q.put(link)
+                score = score_url(
+                    None, DEFAULT_SITEMAP_PRIORITY, depth + 1, change_rates.get(c_link, 0.0)
+                )
+                q.put(link, score, depth + 1)
                 queued.add(link)
                 queued_canon.add(c_link)
 
@@ -282,6 +476,11 @@ def extract_links(html, base_url):
 
 
 def main():
+    if RECRAWL_SINCE and DUPLICATE_MODE == "reset":
+        raise ValueError(
+            'RECRAWL_SINCE only fetches recently modified URLs; set DUPLICATE_MODE to "overwrite" '
+            'or "skip" so "reset" does not delete the existing corpus.'
+        )
     if DUPLICATE_MODE == "reset":
         shutil.rmtree(OUTPUT_DIR, ignore_errors=True)
         try: